@@ -7,63 +7,114 @@ Compat : Safari 26.1 (macOS Sonoma)
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import chain, zip_longest
 import csv
 from pathlib import Path
 import plistlib
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+from urllib.request import HTTPSHandler, Request, build_opener
 from urllib.error import HTTPError, URLError
+import socket
+import sqlite3
 import ssl
 import sys
+import threading
+import time
 from datetime import datetime
 
 # --- Constantes chemins (utilisateur courant) ---
 BOOKMARKS_PATH = Path.home() / "Library/Safari/Bookmarks.plist"
+CACHE_PATH = Path.home() / ".cache/safari-bookmark-checker.sqlite"
+
+# Contexte TLS partagé par tous les workers (chargement des CA une seule fois)
+_SSL_CTX = ssl.create_default_context()
+
+# Contexte sans vérification de certificat (--insecure) : joignabilité brute uniquement
+_INSECURE_SSL_CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_INSECURE_SSL_CTX.check_hostname = False
+_INSECURE_SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Openers construits une seule fois et partagés par les workers
+# (urlopen(context=...) en reconstruit un complet à chaque appel)
+_OPENER = build_opener(HTTPSHandler(context=_SSL_CTX))
+_INSECURE_OPENER = build_opener(HTTPSHandler(context=_INSECURE_SSL_CTX))
 
 # ---------- UTILS ----------
-def is_http_url(url: str) -> bool:
+@lru_cache(maxsize=65536)
+def _split_url(url: str) -> tuple[str, str]:
+    """(scheme, hostname en minuscules) d'une URL, calculé une seule fois par URL."""
     try:
         p = urlparse(url)
-        return p.scheme in ("http", "https")
+        return p.scheme, (p.hostname or "").lower()
     except Exception:
-        return False
+        return "", ""
+
+
+def is_http_url(url: str) -> bool:
+    return _split_url(url)[0] in ("http", "https")
 
 
 def hostname(url: str) -> str:
+    return _split_url(url)[1]
+
+
+# Résolution DNS mise en cache : un seul getaddrinfo par hôte pour tout le run
+_getaddrinfo = socket.getaddrinfo
+
+
+@lru_cache(maxsize=4096)
+def _cached_getaddrinfo(*args, **kwargs):
+    return _getaddrinfo(*args, **kwargs)
+
+
+@contextmanager
+def dns_cache():
+    """Remplace socket.getaddrinfo par sa version mise en cache le temps du bloc."""
+    socket.getaddrinfo = _cached_getaddrinfo
     try:
-        h = urlparse(url).hostname or ""
-        return h.lower()
-    except Exception:
-        return ""
-
-
-# ---------- RECURSIVE WALK ----------
-def walk(children, path_stack, out_rows):
-    for item in children or []:
-        # Dossier
-        if "Children" in item:
-            title = item.get("Title") or item.get("URIDictionary", {}).get("title") or ""
-            path_stack.append(title or "Sans titre")
-            walk(item.get("Children", []), path_stack, out_rows)
-            path_stack.pop()
-            continue
-
-        # Signet URL
-        url = item.get("URLString")
-        if url:
-            title = item.get("URIDictionary", {}).get("title") or item.get("Title") or url
-
-            folder_path = "/".join([p for p in path_stack if p])
-            full_path = folder_path + " / " + title if folder_path else title
-
-            row = {
-                "path": folder_path,
-                "full_path": full_path,
-                "title": title,
-                "url": url,
-                "domain": hostname(url),
-            }
-            out_rows.append(row)
+        yield
+    finally:
+        socket.getaddrinfo = _getaddrinfo
+
+
+# ---------- WALK (pile explicite, sans récursion) ----------
+def make_row(folder_path: str, item: dict) -> dict:
+    url = item["URLString"]
+    uri = item.get("URIDictionary")
+    title = (uri.get("title") if uri else None) or item.get("Title") or url
+    full_path = folder_path + " / " + title if folder_path else title
+    return {
+        "path": folder_path,
+        "full_path": full_path,
+        "title": title,
+        "url": url,
+        "domain": hostname(url),
+    }
+
+
+def walk(children, folder_path, out_rows):
+    # Chaque niveau de la pile : (itérateur sur les enfants, chemin du dossier)
+    stack = [(iter(children or []), folder_path)]
+    while stack:
+        items, folder_path = stack[-1]
+        for item in items:
+            # Dossier : on empile et on le parcourt avant de reprendre ce niveau
+            if "Children" in item:
+                uri = item.get("URIDictionary")
+                title = item.get("Title") or (uri.get("title") if uri else None) or "Sans titre"
+                sub_path = folder_path + "/" + title if folder_path else title
+                stack.append((iter(item.get("Children") or []), sub_path))
+                break
+
+            # Signet URL
+            if item.get("URLString"):
+                out_rows.append(make_row(folder_path, item))
+        else:
+            # Niveau épuisé → on remonte
+            stack.pop()
 
 
 # ---------- LOAD BOOKMARKS ----------
@@ -73,17 +124,37 @@ def load_bookmarks(path: Path):
 
 
 # ---------- URL CHECK ----------
-def check_url(url: str, timeout: int = 10):
+def check_url(url: str, timeout: int = 10, insecure: bool = False):
     if not is_http_url(url):
         return None, "Non-HTTP"
 
-    req = Request(url, headers={
-        "User-Agent": "SafariBookmarkChecker/1.0"
-    })
-    ctx = ssl.create_default_context()
+    headers = {"User-Agent": "SafariBookmarkChecker/1.0"}
+
+    opener = _INSECURE_OPENER if insecure else _OPENER
 
     try:
-        with urlopen(req, timeout=timeout, context=ctx) as resp:
+        # HEAD d'abord : seul le statut compte, inutile de télécharger le corps
+        try:
+            req = Request(url, headers=headers, method="HEAD")
+            with opener.open(req, timeout=timeout) as resp:
+                return resp.getcode(), None
+        except HTTPError:
+            # Erreur sur HEAD (405/501, mais aussi 403, 404 ou 5xx chez certains serveurs
+            # qui servent pourtant la page en GET) → on confirme avec un GET
+            pass
+
+        # GET limité au premier octet du corps
+        try:
+            req = Request(url, headers={**headers, "Range": "bytes=0-0"})
+            with opener.open(req, timeout=timeout) as resp:
+                return resp.getcode(), None
+        except HTTPError as e:
+            # 416 : ressource vide, qui existe bien → GET simple (corps jamais lu)
+            if e.code != 416:
+                raise
+
+        req = Request(url, headers=headers)
+        with opener.open(req, timeout=timeout) as resp:
             return resp.getcode(), None
     except HTTPError as e:
         return e.code, None
@@ -93,14 +164,79 @@ def check_url(url: str, timeout: int = 10):
         return None, f"Error: {e}"
 
 
+def check_one(url: str, timeout: int, insecure: bool, host_sem: threading.Semaphore):
+    """Worker du pool : retourne (url, status, error)."""
+    # Concurrence bornée par hôte pour éviter les 429 / connexions coupées
+    with host_sem:
+        status, error = check_url(url, timeout=timeout, insecure=insecure)
+    return url, status, error
+
+
+def interleave_by_host(items, host_of):
+    """Réordonne les éléments en round-robin par hôte pour étaler les premières requêtes."""
+    groups = {}
+    for it in items:
+        groups.setdefault(host_of(it), []).append(it)
+    return [it for batch in zip_longest(*groups.values()) for it in batch if it is not None]
+
+
+# ---------- CACHE DES STATUTS (SQLite) ----------
+def open_cache(path: Path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS checks ("
+        "url TEXT PRIMARY KEY, status INTEGER, error TEXT, checked_at REAL)"
+    )
+    return db
+
+
+def is_cacheable(status) -> bool:
+    """
+    Statut durable, réutilisable d'un run à l'autre. Pas de réponse, 408, 429 et 5xx
+    sont souvent passagers (timeout, limitation de débit, panne) : ils seront retestés.
+    """
+    return status is not None and status < 500 and status not in (408, 429)
+
+
+def cache_get(db, urls, ttl_seconds: float) -> dict:
+    """Retourne {url: (status, error)} pour les statuts durables obtenus il y a moins de ttl_seconds."""
+    since = time.time() - ttl_seconds
+    hits = {}
+    for url in urls:
+        row = db.execute(
+            "SELECT status, error FROM checks WHERE url = ? AND checked_at >= ?", (url, since)
+        ).fetchone()
+        if row and is_cacheable(row[0]):
+            hits[url] = row
+    return hits
+
+
+def cache_put(db, url: str, status, error):
+    db.execute(
+        "INSERT OR REPLACE INTO checks (url, status, error, checked_at) VALUES (?, ?, ?, ?)",
+        (url, status, error, time.time()),
+    )
+
+
+def close_cache(db):
+    """Valide et ferme le cache. Une erreur SQLite (ex. base verrouillée) n'est qu'un avertissement."""
+    try:
+        db.commit()
+        db.close()
+    except sqlite3.Error as e:
+        print(f"⚠️ Cache indisponible ({e}), statuts de ce run non mémorisés.")
+
+
 # ---------- CSV EXPORT ----------
 def write_csv(rows, path: Path):
     fields = ["full_path", "path", "title", "url", "domain", "status", "error"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
+    with open(path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
         w = csv.DictWriter(f, fieldnames=fields)
         w.writeheader()
-        for r in rows:
-            w.writerow(r)
+        w.writerows(rows)
 
 
 # ---------- MAIN ----------
@@ -111,6 +247,17 @@ def main():
     parser.add_argument("--timeout", type=int, default=10)
     parser.add_argument("--output-csv")
     parser.add_argument("--limit", type=int)
+    parser.add_argument("--workers", type=int, default=32,
+                        help="Nombre de requêtes HTTP en parallèle (défaut : 32).")
+    parser.add_argument("--per-host", type=int, default=4,
+                        help="Requêtes simultanées maximum par hôte (défaut : 4).")
+    parser.add_argument("--cache-ttl", type=float, default=24,
+                        help="Réutiliser les statuts HTTP obtenus depuis moins de N heures "
+                             "(défaut : 24, 0 = désactivé ; sans effet avec --insecure).")
+    parser.add_argument("--cache-path", default=str(CACHE_PATH),
+                        help=f"Fichier SQLite du cache (défaut : {CACHE_PATH}).")
+    parser.add_argument("--insecure", action="store_true",
+                        help="Ne pas vérifier les certificats TLS (joignabilité brute).")
     args = parser.parse_args()
 
     plist_path = Path(args.bookmarks_path).expanduser()
@@ -123,7 +270,7 @@ def main():
 
     # Collecte de tous les signets
     all_rows = []
-    walk(data.get("Children", []), [], all_rows)
+    walk(data.get("Children", []), "", all_rows)
 
     # Filtrage dossier
     target = args.folder.strip() if args.folder else None
@@ -136,39 +283,98 @@ def main():
     if target:
         print(f"📁 Filtre dossier : {target}")
 
-    results = []
-
-    for idx, r in enumerate(rows, start=1):
-        print(f"[{idx}/{len(rows)}] {r['full_path']}")
-        print(f"   URL → {r['url']}")
-
-        status, error = check_url(r["url"], timeout=args.timeout)
-
-        # Texte du statut
-        if status is not None:
-            if 200 <= status < 300:
-                status_text = f"{status} (OK)"
-            elif 300 <= status < 400:
-                status_text = f"{status} (Redirection)"
-            elif 400 <= status < 500:
-                status_text = f"{status} (Erreur client)"
-            else:
-                status_text = f"{status} (Erreur serveur)"
-        else:
-            status_text = "Aucune réponse"
-
-        print(f"   Statut → {status_text}" + (f" | {error}" if error else ""))
-        print()  # saut de ligne
-
-        results.append({
-            "full_path": r["full_path"],
-            "path": r["path"],
-            "title": r["title"],
-            "url": r["url"],
-            "domain": r["domain"],
-            "status": status if status else "",
-            "error": error or "",
-        })
+    # Une seule requête par URL distincte (signets en double dans plusieurs dossiers)
+    by_url = {}
+    for idx, r in enumerate(rows):
+        by_url.setdefault(r["url"], []).append(idx)
+    if len(by_url) < len(rows):
+        print(f"🔁 URL distinctes : {len(by_url)}")
+
+    # Statuts déjà connus (runs précédents) : aucune requête réseau pour ces URL.
+    # Cache réservé aux runs avec vérification TLS : un 200 obtenu en --insecure
+    # ne dit rien d'un site au certificat invalide.
+    db = None
+    cached = {}
+    if args.cache_ttl > 0 and not args.insecure:
+        try:
+            db = open_cache(Path(args.cache_path).expanduser())
+            cached = cache_get(db, by_url, args.cache_ttl * 3600)
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️ Cache indisponible ({e}), tous les signets seront testés.")
+            db = None
+        if cached:
+            print(f"💾 Statuts repris du cache : {len(cached)}")
+
+    results = [None] * len(rows)
+    done = 0
+
+    with dns_cache(), ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        host_sems = {r["domain"]: threading.Semaphore(max(1, args.per_host)) for r in rows}
+        queue = interleave_by_host(by_url, hostname)
+        futures = [
+            pool.submit(check_one, url, args.timeout, args.insecure, host_sems[hostname(url)])
+            for url in queue
+            if url not in cached
+        ]
+        outcomes = chain(
+            ((url, *cached[url]) for url in cached),
+            (fut.result() for fut in as_completed(futures)),
+        )
+
+        try:
+            # Affichage au fil des réponses, résultats rangés dans l'ordre d'origine
+            for url, status, error in outcomes:
+                # Seuls les statuts durables sont mémorisés : un timeout, une erreur réseau,
+                # un 429 ou un 5xx doit être retenté au prochain run (voir is_cacheable)
+                if db is not None and is_cacheable(status) and url not in cached:
+                    try:
+                        cache_put(db, url, status, error)
+                    except sqlite3.Error as e:
+                        # Cache optionnel : on continue sans lui plutôt que de perdre le run
+                        print(f"⚠️ Cache indisponible ({e}), statuts de ce run non mémorisés.")
+                        db.close()
+                        db = None
+
+                # Texte du statut
+                if status is not None:
+                    if 200 <= status < 300:
+                        status_text = f"{status} (OK)"
+                    elif 300 <= status < 400:
+                        status_text = f"{status} (Redirection)"
+                    elif 400 <= status < 500:
+                        status_text = f"{status} (Erreur client)"
+                    else:
+                        status_text = f"{status} (Erreur serveur)"
+                else:
+                    status_text = "Aucune réponse"
+
+                # Le même résultat vaut pour chaque exemplaire du signet
+                for idx in by_url[url]:
+                    done += 1
+                    r = rows[idx]
+
+                    print(f"[{done}/{len(rows)}] {r['full_path']}")
+                    print(f"   URL → {r['url']}")
+                    print(f"   Statut → {status_text}" + (f" | {error}" if error else ""))
+                    print()  # saut de ligne
+
+                    results[idx] = {
+                        "full_path": r["full_path"],
+                        "path": r["path"],
+                        "title": r["title"],
+                        "url": r["url"],
+                        "domain": r["domain"],
+                        "status": status if status else "",
+                        "error": error or "",
+                    }
+        except KeyboardInterrupt:
+            # Ctrl+C : on abandonne les vérifications encore en file d'attente
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            # Même interrompu, le run conserve les statuts déjà obtenus
+            if db is not None:
+                close_cache(db)
 
     if args.output_csv:
         write_csv(results, Path(args.output_csv).expanduser())
@@ -14,6 +14,7 @@ Fonctionnalités :
 
 import argparse
 import csv
+from functools import lru_cache
 import json
 from pathlib import Path
 import plistlib
@@ -21,9 +22,16 @@ from urllib.parse import urlparse
 from datetime import datetime
 import sys
 
+try:
+    # Optionnel (pip3 install orjson) : sérialisation JSON bien plus rapide
+    import orjson
+except ImportError:
+    orjson = None
+
 # --- Constantes chemins (utilisateur courant) ---
 BOOKMARKS_PATH = Path.home() / "Library/Safari/Bookmarks.plist"
 
+@lru_cache(maxsize=65536)
 def hostname(url: str) -> str:
     try:
         h = urlparse(url).hostname or ""
@@ -31,23 +39,45 @@ def hostname(url: str) -> str:
     except Exception:
         return ""
 
-def matches_domain(host: str, targets: list[str]) -> bool:
-    if not targets:
+def compile_domains(targets: list[str]) -> frozenset:
+    """Normalise une seule fois les domaines cibles (minuscules, sans point initial)."""
+    return frozenset(d for d in (t.lower().lstrip(".") for t in targets) if d)
+
+def matches_domain(host: str, domains: frozenset) -> bool:
+    if not domains:
         return True
+    # On remonte les suffixes du host (a.b.com -> b.com -> com) :
+    # une recherche dans l'ensemble par label, quel que soit le nombre de domaines
     host = (host or "").lower().strip(".")
-    if not host:
-        return False
-    for d in targets:
-        d = d.lower().lstrip(".")
-        if host == d or host.endswith("." + d):
+    while host:
+        if host in domains:
             return True
+        host = host.partition(".")[2]
     return False
 
-def contains_search(haystack: str, needles: list[str]) -> bool:
+def contains_search(haystack: str, needles: tuple) -> bool:
+    # needles est déjà en minuscules (voir build_filter)
     if not needles:
         return True
     h = (haystack or "").lower()
-    return all(n.lower() in h for n in needles)
+    return all(n in h for n in needles)
+
+def build_filter(domain_args: list[str], search_args: list[str]):
+    """
+    Prépare une seule fois, pour les arguments CLI, le prédicat de filtrage des lignes :
+    domaines et mots-clés normalisés d'avance, filtres absents court-circuités.
+    """
+    domains = compile_domains(domain_args)
+    needles = tuple(n.lower() for n in search_args)
+
+    def keep(r) -> bool:
+        if domains and not matches_domain(r["domain"], domains):
+            return False
+        if needles and not contains_search((r["title"] or "") + " " + (r["url"] or ""), needles):
+            return False
+        return True
+
+    return keep
 
 def to_iso(dt):
     if isinstance(dt, datetime):
@@ -55,68 +85,110 @@ def to_iso(dt):
         return dt.isoformat()
     return ""
 
-def walk(children, path_stack, out_rows):
+def format_dates(r: dict) -> dict:
+    """Formate les dates d'une ligne au moment de l'écrire (CSV)."""
+    r["added_at"] = to_iso(r["added_at"])
+    r["modified_at"] = to_iso(r["modified_at"])
+    return r
+
+def make_row(folder_path: str, item: dict) -> dict:
+    # Dates laissées brutes (datetime ou "") : formatées seulement si la colonne est émise
+    url = item["URLString"]
+    uri = item.get("URIDictionary")
+    title = (uri.get("title") if uri else None) or item.get("Title") or url
+    return {
+        "path": folder_path,
+        "title": title,
+        "url": url,
+        "domain": hostname(url),
+        "added_at": item.get("DateAdded") or "",
+        "modified_at": item.get("LastModified") or ""
+    }
+
+def walk(children, folder_path=""):
     """
-    Parcours récursif de la hiérarchie de signets.
-    Accumule les entrées URL sous forme de dicts dans out_rows.
+    Parcours de la hiérarchie de signets, avec une pile explicite (sans récursion).
+    Génère les entrées URL sous forme de dicts, au fil du parcours.
+    folder_path est le chemin du dossier courant, construit au fil de la descente.
     """
-    for item in children or []:
-        # Dossier
-        if "Children" in item:
-            title = item.get("Title") or item.get("URIDictionary", {}).get("title") or ""
-            path_stack.append(title or "Sans titre")
-            walk(item.get("Children", []), path_stack, out_rows)
-            path_stack.pop()
-            continue
-
-        # Feuille URL
-        url = item.get("URLString")
-        if url:
-            title = item.get("URIDictionary", {}).get("title") or item.get("Title") or url
-            row = {
-                "path": "/".join([p for p in path_stack if p]),
-                "title": title,
-                "url": url,
-                "domain": hostname(url),
-                "added_at": to_iso(item.get("DateAdded")),
-                "modified_at": to_iso(item.get("LastModified"))
-            }
-            out_rows.append(row)
+    # Chaque niveau de la pile : (itérateur sur les enfants, chemin du dossier)
+    stack = [(iter(children or []), folder_path)]
+    while stack:
+        items, folder_path = stack[-1]
+        for item in items:
+            # Dossier : on empile et on le parcourt avant de reprendre ce niveau
+            if "Children" in item:
+                uri = item.get("URIDictionary")
+                title = item.get("Title") or (uri.get("title") if uri else None) or "Sans titre"
+                sub_path = folder_path + "/" + title if folder_path else title
+                stack.append((iter(item.get("Children") or []), sub_path))
+                break
+
+            # Feuille URL
+            if item.get("URLString"):
+                yield make_row(folder_path, item)
+        else:
+            # Niveau épuisé → on remonte
+            stack.pop()
 
 def load_bookmarks(path: Path):
     with open(path, "rb") as f:
         return plistlib.load(f)
 
 def print_table(rows):
-    # Auto-width simple
-    cols = ["path", "title", "url", "domain", "added_at"]
-    widths = {c: len(c) for c in cols}
-    for r in rows:
-        for c in cols:
-            widths[c] = max(widths[c], len(r.get(c, "") or ""))
-    line = " | ".join(c.ljust(widths[c]) for c in cols)
-    sep = "-+-".join("-" * widths[c] for c in cols)
-    print(line)
-    print(sep)
-    for r in rows:
-        print(" | ".join((r.get(c, "") or "").ljust(widths[c]) for c in cols))
-
-def write_csv(rows, path):
+    # Auto-width simple : cellules extraites une fois en tuples, largeur calculée par colonne
+    cols = ("path", "title", "url", "domain", "added_at")
+    cells = [(r["path"], r["title"], r["url"], r["domain"], to_iso(r["added_at"])) for r in rows]
+    widths = [max(len(c), max((len(t[i]) for t in cells), default=0)) for i, c in enumerate(cols)]
+    fmt = " | ".join(f"{{:<{w}}}" for w in widths)
+    print(fmt.format(*cols))
+    print("-+-".join("-" * w for w in widths))
+    for t in cells:
+        print(fmt.format(*t))
+
+def write_csv(rows, f) -> int:
+    """Écrit les lignes au fil de l'eau dans f. Retourne le nombre de lignes écrites."""
     cols = ["path", "title", "url", "domain", "added_at", "modified_at"]
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=cols)
-        w.writeheader()
+    w = csv.DictWriter(f, fieldnames=cols)
+    w.writeheader()
+    written = 0
+
+    def formatted():
+        nonlocal written
         for r in rows:
-            w.writerow(r)
+            written += 1
+            yield format_dates(r)
+
+    w.writerows(formatted())
+    return written
+
+def json_dumps(obj, indent: bool = False) -> str:
+    """
+    Sérialise en JSON (UTF-8 brut), via orjson si disponible, sinon la lib standard.
+    Les datetime sont écrits en ISO 8601 : nativement par orjson, via to_iso sinon.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    # Séparateurs alignés sur orjson : même sortie, que orjson soit installé ou non
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2, default=to_iso)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=to_iso)
 
-def write_json(rows, path):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(rows, f, ensure_ascii=False, indent=2)
+def write_json(rows, f):
+    f.write(json_dumps(rows, indent=True))
 
-def write_ndjson(rows, path):
-    with open(path, "w", encoding="utf-8") as f:
+def write_ndjson(rows, f) -> int:
+    """Écrit une ligne JSON par signet au fil de l'eau. Retourne le nombre de lignes écrites."""
+    written = 0
+
+    def lines():
+        nonlocal written
         for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+            written += 1
+            yield json_dumps(r) + "\n"
+
+    f.writelines(lines())
+    return written
 
 def main():
     parser = argparse.ArgumentParser(description="Lister les signets Safari.")
@@ -142,30 +214,31 @@ def main():
         print(f"❌ Impossible de lire le plist : {e}")
         sys.exit(1)
 
-    rows = []
-    walk(data.get("Children", []), [], rows)
+    # Filtres, appliqués au fil du parcours
+    keep = build_filter(args.domain, args.search)
+    rows = (r for r in walk(data.get("Children", [])) if keep(r))
 
-    # Filtres
-    filtered = []
-    for r in rows:
-        if not matches_domain(r["domain"], args.domain):
-            continue
-        if not contains_search((r["title"] or "") + " " + (r["url"] or ""), args.search):
-            continue
-        filtered.append(r)
+    # CSV / NDJSON : écriture en flux, dans l'ordre de Bookmarks.plist (sans tri)
+    if args.format in ("csv", "ndjson"):
+        writer = write_csv if args.format == "csv" else write_ndjson
+        if args.output:
+            out_path = Path(args.output).expanduser()
+            with open(out_path, "w", newline="", encoding="utf-8", buffering=1 << 20) as f:
+                written = writer(rows, f)
+            print(f"✅ Écrit : {out_path} ({args.format}, {written} lignes)")
+        else:
+            writer(rows, sys.stdout)
+        return
 
-    # Sort simple par chemin puis titre
-    filtered.sort(key=lambda x: (x["path"].lower(), x["title"].lower()))
+    # Table / JSON : tri simple par chemin puis titre
+    filtered = sorted(rows, key=lambda x: (x["path"].lower(), x["title"].lower()))
 
     # Sortie
     if args.output:
         out_path = Path(args.output).expanduser()
-        if args.format == "csv":
-            write_csv(filtered, out_path)
-        elif args.format == "json":
-            write_json(filtered, out_path)
-        elif args.format == "ndjson":
-            write_ndjson(filtered, out_path)
+        if args.format == "json":
+            with open(out_path, "w", encoding="utf-8") as f:
+                write_json(filtered, f)
         else:
             # table vers fichier
             # On génère une table texte
@@ -178,13 +251,8 @@ def main():
     else:
         if args.format == "table":
             print_table(filtered)
-        elif args.format == "csv":
-            write_csv(filtered, sys.stdout)  # non interactif; on garde table par défaut
         elif args.format == "json":
-            print(json.dumps(filtered, ensure_ascii=False, indent=2))
-        elif args.format == "ndjson":
-            for r in filtered:
-                print(json.dumps(r, ensure_ascii=False))
+            print(json_dumps(filtered, indent=True))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
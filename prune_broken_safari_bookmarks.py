@@ -11,38 +11,80 @@ pendant l'exécution.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import zip_longest
+import os
 import plistlib
 from pathlib import Path
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
+from urllib.request import HTTPSHandler, Request, build_opener
 from urllib.error import HTTPError, URLError
+import socket
+import shutil
 import ssl
 from datetime import datetime
 import sys
-import time
+import tempfile
+import threading
 
 # --- Constantes chemins (utilisateur courant) ---
 BOOKMARKS_PATH = Path.home() / "Library/Safari/Bookmarks.plist"
 
+# Contexte TLS partagé par tous les workers (chargement des CA une seule fois)
+_SSL_CTX = ssl.create_default_context()
+
+# Contexte sans vérification de certificat (--insecure) : joignabilité brute uniquement
+_INSECURE_SSL_CTX = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+_INSECURE_SSL_CTX.check_hostname = False
+_INSECURE_SSL_CTX.verify_mode = ssl.CERT_NONE
+
+# Openers construits une seule fois et partagés par les workers
+# (urlopen(context=...) en reconstruit un complet à chaque appel)
+_OPENER = build_opener(HTTPSHandler(context=_SSL_CTX))
+_INSECURE_OPENER = build_opener(HTTPSHandler(context=_INSECURE_SSL_CTX))
+
 # ---------- UTILITAIRES URL ----------
 
-def is_http_url(url: str) -> bool:
+@lru_cache(maxsize=65536)
+def _split_url(url: str) -> tuple[str, str]:
+    """(scheme, hostname en minuscules) d'une URL, calculé une seule fois par URL."""
     try:
         p = urlparse(url)
-        return p.scheme in ("http", "https")
+        return p.scheme, (p.hostname or "").lower()
     except Exception:
-        return False
+        return "", ""
+
+
+def is_http_url(url: str) -> bool:
+    return _split_url(url)[0] in ("http", "https")
 
 
 def hostname(url: str) -> str:
+    return _split_url(url)[1]
+
+
+# Résolution DNS mise en cache : un seul getaddrinfo par hôte pour tout le run
+_getaddrinfo = socket.getaddrinfo
+
+
+@lru_cache(maxsize=4096)
+def _cached_getaddrinfo(*args, **kwargs):
+    return _getaddrinfo(*args, **kwargs)
+
+
+@contextmanager
+def dns_cache():
+    """Remplace socket.getaddrinfo par sa version mise en cache le temps du bloc."""
+    socket.getaddrinfo = _cached_getaddrinfo
     try:
-        h = urlparse(url).hostname or ""
-        return h.lower()
-    except Exception:
-        return ""
+        yield
+    finally:
+        socket.getaddrinfo = _getaddrinfo
 
 
-def check_url(url: str, timeout: int = 10):
+def check_url(url: str, timeout: int = 10, insecure: bool = False):
     """
     Teste une URL.
     Retourne (status_code, error_message).
@@ -52,14 +94,33 @@ def check_url(url: str, timeout: int = 10):
     if not is_http_url(url):
         return None, "Non-HTTP"
 
-    req = Request(
-        url,
-        headers={"User-Agent": "SafariBookmarkPruner/1.0"},
-    )
-    ctx = ssl.create_default_context()
+    headers = {"User-Agent": "SafariBookmarkPruner/1.0"}
+
+    opener = _INSECURE_OPENER if insecure else _OPENER
 
     try:
-        with urlopen(req, timeout=timeout, context=ctx) as resp:
+        # HEAD d'abord : seul le statut compte, inutile de télécharger le corps
+        try:
+            req = Request(url, headers=headers, method="HEAD")
+            with opener.open(req, timeout=timeout) as resp:
+                return resp.getcode(), None
+        except HTTPError:
+            # Erreur sur HEAD (405/501, mais aussi 403, 404 ou 5xx chez certains serveurs
+            # qui servent pourtant la page en GET) → on confirme avec un GET
+            pass
+
+        # GET limité au premier octet du corps
+        try:
+            req = Request(url, headers={**headers, "Range": "bytes=0-0"})
+            with opener.open(req, timeout=timeout) as resp:
+                return resp.getcode(), None
+        except HTTPError as e:
+            # 416 : ressource vide, qui existe bien → GET simple (corps jamais lu)
+            if e.code != 416:
+                raise
+
+        req = Request(url, headers=headers)
+        with opener.open(req, timeout=timeout) as resp:
             return resp.getcode(), None
     except HTTPError as e:
         return e.code, None
@@ -74,114 +135,200 @@ def check_url(url: str, timeout: int = 10):
 def backup_bookmarks(path: Path) -> Path:
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
     backup_path = path.with_name(f"Bookmarks.backup.{ts}.plist")
-    backup_path.write_bytes(path.read_bytes())
+    # Deux lancements dans la même seconde : l'ancienne sauvegarde est remplacée
+    backup_path.unlink(missing_ok=True)
+    try:
+        # Lien physique : instantané, sans recopier le fichier. L'original n'est
+        # jamais modifié sur place (voir write_plist_atomic), la sauvegarde reste intacte.
+        os.link(path, backup_path)
+    except OSError:
+        shutil.copy2(path, backup_path)
     return backup_path
 
 
-# ---------- FILTRAGE RECURSIF + SUPPRESSION ----------
+def write_plist_atomic(data, path: Path):
+    """
+    Écrit le plist dans un fichier temporaire du même dossier, puis le renomme
+    par-dessus l'original (os.replace) : jamais de Bookmarks.plist à moitié écrit.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".Bookmarks.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            plistlib.dump(data, f)
+            # Données sur disque avant le renommage : après une coupure de courant,
+            # Bookmarks.plist est soit l'ancien, soit le nouveau, jamais vide
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+# ---------- COLLECTE DES SIGNETS A TESTER ----------
 
-def prune_children(children, path_stack, folder_filter, timeout, dry_run, min_status, stats):
+def collect_leaves(children, folder_path, folder_filter, out):
     """
-    Parcours récursif de la hiérarchie de signets.
-    Retourne une nouvelle liste Children filtrée.
+    Parcours de la hiérarchie de signets, avec une pile explicite (sans récursion).
+    Accumule dans out les signets URL à tester : dicts {item, parent, full_path, url, domain}.
+    parent est le dossier qui contient le signet (None au premier niveau) : la
+    réécriture de l'arbre pourra ainsi cibler ce dossier sans reparcourir la hiérarchie.
 
+    - folder_path : chemin du dossier courant, construit au fil de la descente
     - folder_filter : str ou None, chemin type "Barre de favoris/Dev"
-    - stats : dict pour compter ce qui se passe
     """
-    new_children = []
-
-    for item in children or []:
-        # Dossier
-        if "Children" in item:
-            title = item.get("Title") or item.get("URIDictionary", {}).get("title") or ""
-            path_stack.append(title or "Sans titre")
-
-            folder_path = "/".join([p for p in path_stack if p])
-
-            # On descend toujours récursivement, mais on n'applique la
-            # condition de suppression que si le chemin commence par folder_filter
-            filtered_kids = prune_children(
-                item.get("Children", []),
-                path_stack,
-                folder_filter,
-                timeout,
-                dry_run,
-                min_status,
-                stats,
-            )
-
-            # On met à jour les enfants
-            item["Children"] = filtered_kids
-            new_children.append(item)
-
-            path_stack.pop()
-            continue
-
-        # Signet URL
-        url = item.get("URLString")
-        if not url:
-            new_children.append(item)
-            continue
-
-        title = item.get("URIDictionary", {}).get("title") or item.get("Title") or url
-        folder_path = "/".join([p for p in path_stack if p])
-        full_path = folder_path + " / " + title if folder_path else title
-
-        # Si un filtre de dossier est défini et que le chemin ne matche pas, on ne supprime pas
-        if folder_filter and not folder_path.startswith(folder_filter):
-            new_children.append(item)
-            continue
-
-        stats["total_tested"] += 1
-
-        print(f"[{stats['total_tested']}] {full_path}")
-        print(f"   URL → {url}")
-
-        status, error = check_url(url, timeout=timeout)
-
-        # Décision de suppression : statut None (pas de réponse) ou >= min_status
-        to_delete = False
-
-        if status is None:
-            to_delete = True
-            reason = error or "Aucune réponse"
-        elif status >= min_status:
-            to_delete = True
-            reason = f"Statut HTTP {status}"
-        else:
-            reason = f"Statut HTTP {status}"
-
-        if status is not None:
-            if 200 <= status < 300:
-                status_text = f"{status} (OK)"
-            elif 300 <= status < 400:
-                status_text = f"{status} (Redirection)"
-            elif 400 <= status < 500:
-                status_text = f"{status} (Erreur client)"
-            else:
-                status_text = f"{status} (Erreur serveur)"
-        else:
-            status_text = "Aucune réponse"
-
-        print(f"   Statut → {status_text}" + (f" | {error}" if error else ""))
-        if to_delete:
-            stats["total_broken"] += 1
-            print(f"   🔥 Marqué pour suppression ({reason})")
-            if dry_run:
-                # En dry-run on NE supprime pas réellement, on garde dans la liste
-                new_children.append(item)
-            else:
-                stats["total_deleted"] += 1
-                # on ne fait pas append → suppression
+    # Chaque niveau de la pile : (itérateur sur les enfants, chemin du dossier, dossier)
+    stack = [(iter(children or []), folder_path, None)]
+    while stack:
+        items, folder_path, folder = stack[-1]
+        for item in items:
+            # Dossier : on empile et on le parcourt avant de reprendre ce niveau
+            if "Children" in item:
+                uri = item.get("URIDictionary")
+                title = item.get("Title") or (uri.get("title") if uri else None) or "Sans titre"
+                sub_path = folder_path + "/" + title if folder_path else title
+                stack.append((iter(item.get("Children") or []), sub_path, item))
+                break
+
+            # Signet URL
+            url = item.get("URLString")
+            if not url:
+                continue
+
+            uri = item.get("URIDictionary")
+            title = (uri.get("title") if uri else None) or item.get("Title") or url
+            full_path = folder_path + " / " + title if folder_path else title
+
+            # Si un filtre de dossier est défini et que le chemin ne matche pas, on ne teste pas
+            if folder_filter and not folder_path.startswith(folder_filter):
+                continue
+
+            out.append({
+                "item": item,
+                "parent": folder,
+                "full_path": full_path,
+                "url": url,
+                "domain": hostname(url),
+            })
         else:
-            print("   ✅ Conservé")
-            new_children.append(item)
+            # Niveau épuisé → on remonte
+            stack.pop()
 
-        print()
-        # Petite pause optionnelle si tu veux éviter d'agresser les serveurs
-        # time.sleep(0.1)
 
-    return new_children
+# ---------- TESTS HTTP EN PARALLELE ----------
+
+def check_one(url: str, timeout: int, insecure: bool, host_sem: threading.Semaphore):
+    """Worker du pool : retourne (url, status, error)."""
+    # Concurrence bornée par hôte pour éviter les 429 / connexions coupées
+    with host_sem:
+        status, error = check_url(url, timeout=timeout, insecure=insecure)
+    return url, status, error
+
+
+def interleave_by_host(items, host_of):
+    """Réordonne les éléments en round-robin par hôte pour étaler les premières requêtes."""
+    groups = {}
+    for it in items:
+        groups.setdefault(host_of(it), []).append(it)
+    return [it for batch in zip_longest(*groups.values()) for it in batch if it is not None]
+
+
+def check_leaves(leaves, timeout, insecure, workers, per_host, min_status, stats):
+    """
+    Teste tous les signets collectés en parallèle, une seule requête par URL distincte :
+    tous les exemplaires d'un même signet partagent le résultat (et sont supprimés ensemble).
+    Retourne un dict id(item) -> bool (True = à conserver).
+    """
+    keep = {}
+
+    by_url = {}
+    for leaf in leaves:
+        by_url.setdefault(leaf["url"], []).append(leaf)
+    if len(by_url) < len(leaves):
+        print(f"🔁 URL distinctes : {len(by_url)} (pour {len(leaves)} signets)\n")
+
+    with dns_cache(), ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        host_sems = {leaf["domain"]: threading.Semaphore(max(1, per_host)) for leaf in leaves}
+        queue = interleave_by_host(by_url, hostname)
+        futures = [
+            pool.submit(check_one, url, timeout, insecure, host_sems[hostname(url)])
+            for url in queue
+        ]
+
+        try:
+            for fut in as_completed(futures):
+                url, status, error = fut.result()
+
+                # Décision de suppression : statut None (pas de réponse) ou >= min_status
+                to_delete = False
+
+                if status is None:
+                    to_delete = True
+                    reason = error or "Aucune réponse"
+                elif status >= min_status:
+                    to_delete = True
+                    reason = f"Statut HTTP {status}"
+                else:
+                    reason = f"Statut HTTP {status}"
+
+                if status is not None:
+                    if 200 <= status < 300:
+                        status_text = f"{status} (OK)"
+                    elif 300 <= status < 400:
+                        status_text = f"{status} (Redirection)"
+                    elif 400 <= status < 500:
+                        status_text = f"{status} (Erreur client)"
+                    else:
+                        status_text = f"{status} (Erreur serveur)"
+                else:
+                    status_text = "Aucune réponse"
+
+                for leaf in by_url[url]:
+                    stats["total_tested"] += 1
+
+                    print(f"[{stats['total_tested']}/{len(leaves)}] {leaf['full_path']}")
+                    print(f"   URL → {leaf['url']}")
+                    print(f"   Statut → {status_text}" + (f" | {error}" if error else ""))
+                    if to_delete:
+                        stats["total_broken"] += 1
+                        print(f"   🔥 Marqué pour suppression ({reason})")
+                    else:
+                        print("   ✅ Conservé")
+                    print()
+
+                    keep[id(leaf["item"])] = not to_delete
+        except KeyboardInterrupt:
+            # Ctrl+C : on abandonne les vérifications encore en file d'attente
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    return keep
+
+
+# ---------- SUPPRESSION ----------
+
+def prune_children(children, leaves, keep, stats):
+    """
+    Réécrit l'arbre à partir des résultats, sans le reparcourir : seuls les dossiers
+    parents (notés lors de la collecte) d'au moins un signet à supprimer sont touchés.
+    Retourne la nouvelle liste Children de premier niveau.
+    """
+    root = {"Children": children}
+
+    # Plan : dossiers à réécrire, chacun une seule fois
+    plans = {}
+    for leaf in leaves:
+        if not keep[id(leaf["item"])]:
+            parent = leaf["parent"] or root
+            plans[id(parent)] = parent
+
+    for folder in plans.values():
+        old = folder.get("Children") or []
+        folder["Children"] = [child for child in old if keep.get(id(child), True)]
+        stats["total_deleted"] += len(old) - len(folder["Children"])
+
+    return root["Children"]
 
 
 # ---------- MAIN ----------
@@ -216,6 +363,23 @@ def main():
         default=300,
         help="Seuil de statut HTTP à partir duquel on supprime (défaut : 300).",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=32,
+        help="Nombre de requêtes HTTP en parallèle (défaut : 32).",
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=4,
+        help="Requêtes simultanées maximum par hôte (défaut : 4).",
+    )
+    parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="Ne pas vérifier les certificats TLS (joignabilité brute, déconseillé avant suppression).",
+    )
 
     args = parser.parse_args()
 
@@ -255,16 +419,23 @@ def main():
     children = data.get("Children", [])
     folder_filter = args.folder.strip() if args.folder else None
 
-    new_children = prune_children(
-        children=children,
-        path_stack=[],
-        folder_filter=folder_filter,
+    # 1) Collecte, 2) tests HTTP en parallèle, 3) réécriture de l'arbre
+    leaves = []
+    collect_leaves(children, "", folder_filter, leaves)
+
+    keep = check_leaves(
+        leaves,
         timeout=args.timeout,
-        dry_run=args.dry_run,
+        insecure=args.insecure,
+        workers=args.workers,
+        per_host=args.per_host,
         min_status=args.min_status,
         stats=stats,
     )
 
+    if not args.dry_run:
+        new_children = prune_children(children, leaves, keep, stats)
+
     print("📊 Récapitulatif :")
     print(f"   Signets testés       : {stats['total_tested']}")
     print(f"   Signets cassés       : {stats['total_broken']}")
@@ -282,14 +453,11 @@ def main():
     # Écriture du plist mis à jour
     data["Children"] = new_children
     try:
-        with open(plist_path, "wb") as f:
-            plistlib.dump(data, f)
+        write_plist_atomic(data, plist_path)
         print("✅ Fichier Bookmarks.plist mis à jour.")
     except Exception as e:
         print(f"❌ Erreur d'écriture du plist : {e}")
-        print("↩️ Restauration de la sauvegarde...")
-        plist_path.write_bytes(backup_path.read_bytes())
-        print("✅ Restauration effectuée.")
+        print("↩️ Fichier original intact (écriture atomique), rien à restaurer.")
         sys.exit(1)
 
 
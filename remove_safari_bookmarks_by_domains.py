@@ -7,84 +7,91 @@ Compat : Safari 26.1 (macOS Sonoma) et versions proches
 """
 
 import argparse
+from functools import lru_cache
+import os
 import plistlib
 from pathlib import Path
 from urllib.parse import urlparse
 from datetime import datetime
+import shutil
 import sys
+import tempfile
 
 # --- Constantes chemins (utilisateur courant) ---
 BOOKMARKS_PATH = Path.home() / "Library/Safari/Bookmarks.plist"
 
 # --- Utilitaires domaine ------------------------------------------------------
+@lru_cache(maxsize=65536)
 def hostname(url: str) -> str:
-    """Retourne le hostname (sans port) à partir d'une URL. None si non parsable."""
+    """
+    Retourne le hostname (sans port, minuscules, sans point final) à partir d'une URL,
+    mis en cache par URL. "" si non parsable.
+    """
     try:
         h = urlparse(url).hostname
-        return (h or "").lower()
+        return (h or "").lower().strip(".")
     except Exception:
         return ""
 
-def matches_domain(host: str, targets: list[str]) -> bool:
+def compile_domains(targets: list[str]) -> tuple[frozenset, tuple]:
     """
-    Retourne True si host correspond à l'un des domaines cibles.
-    - Correspondances par suffixe (ex: *.example.com -> example.com)
-    - Comparaison insensible à la casse
+    Prépare une seule fois les domaines cibles (minuscules, sans point initial) :
+    - exact : frozenset des domaines
+    - suffixes : tuple des ".domaine", testé d'un coup par str.endswith
     """
-    host = (host or "").lower().strip(".")
-    if not host:
-        return False
-
-    for d in targets:
-        d = d.lower().lstrip(".")
-        if not d:
-            continue
-        if host == d or host.endswith("." + d):
-            return True
-    return False
+    exact = frozenset(d for d in (t.lower().lstrip(".") for t in targets) if d)
+    suffixes = tuple("." + d for d in exact)
+    return exact, suffixes
 
 # --- Filtrage récursif --------------------------------------------------------
-def filter_children(children: list, targets: list[str], ignore_folders: set[str], dry_run: bool):
+def filter_children(children: list, exact: frozenset, suffixes: tuple,
+                    ignore_folders: set[str], dry_run: bool):
     """
-    Parcourt récursivement la hiérarchie 'Children' et filtre les bookmarks.
+    Parcourt la hiérarchie 'Children' (pile explicite, sans récursion) et filtre les bookmarks.
     Retourne (nouveaux_enfants, nb_suppr)
     """
     new_children = []
     deleted = 0
 
-    for item in children or []:
-        # Dossiers (listes)
-        if "Children" in item:
-            title = item.get("Title") or item.get("URIDictionary", {}).get("title") or ""
-            # Si on doit ignorer ce dossier, on le recopie tel quel
-            if title in ignore_folders:
-                new_children.append(item)
-                continue
-
-            filtered_kids, del_count = filter_children(item.get("Children", []), targets, ignore_folders, dry_run)
-            # On met à jour uniquement si pas dry-run
-            if not dry_run:
-                item["Children"] = filtered_kids
-            deleted += del_count
-            new_children.append(item)
-            continue
-
-        # Feuilles (URL)
-        url = item.get("URLString")
-        if url:
-            host = hostname(url)
-            if matches_domain(host, targets):
-                title = item.get("URIDictionary", {}).get("title") or item.get("Title") or url
-                print(f"➡️  Match domaine → suppression : {title} ({url})")
-                deleted += 1
-                # En dry-run, on NE supprime pas réellement (on garde l'item)
-                if dry_run:
-                    new_children.append(item)
-                # sinon on saute l'append → l'élément est supprimé
-                continue
-
-        # Aucun match → conserver
-        new_children.append(item)
+    # Chaque niveau de la pile : (itérateur sur les enfants, dossier, enfants conservés)
+    stack = [(iter(children or []), None, new_children)]
+    while stack:
+        items, folder, kept = stack[-1]
+        for item in items:
+            # Dossiers (listes)
+            if "Children" in item:
+                kept.append(item)
+                uri = item.get("URIDictionary")
+                title = item.get("Title") or (uri.get("title") if uri else None) or ""
+                # Si on doit ignorer ce dossier, on le recopie tel quel
+                if title in ignore_folders:
+                    continue
+                stack.append((iter(item.get("Children") or []), item, []))
+                break
+
+            # Feuilles (URL)
+            url = item.get("URLString")
+            if url:
+                # Domaine exact ou sous-domaine (host déjà normalisé par hostname)
+                host = hostname(url)
+                if host in exact or host.endswith(suffixes):
+                    uri = item.get("URIDictionary")
+                    title = (uri.get("title") if uri else None) or item.get("Title") or url
+                    print(f"➡️  Match domaine → suppression : {title} ({url})")
+                    deleted += 1
+                    # En dry-run, on NE supprime pas réellement (on garde l'item)
+                    if dry_run:
+                        kept.append(item)
+                    # sinon on saute l'append → l'élément est supprimé
+                    continue
+
+            # Aucun match → conserver
+            kept.append(item)
+        else:
+            # Dossier épuisé → on remonte ; mise à jour uniquement si pas dry-run
+            stack.pop()
+            if folder is not None and not dry_run:
+                folder["Children"] = kept
 
     return new_children, deleted
 
@@ -92,9 +99,35 @@ def filter_children(children: list, targets: list[str], ignore_folders: set[str]
 def backup_bookmarks(bookmarks_path: Path) -> Path:
     ts = datetime.now().strftime("%Y%m%d-%H%M%S")
     backup_path = bookmarks_path.with_name(f"Bookmarks.backup.{ts}.plist")
-    backup_path.write_bytes(bookmarks_path.read_bytes())
+    # Deux lancements dans la même seconde : l'ancienne sauvegarde est remplacée
+    backup_path.unlink(missing_ok=True)
+    try:
+        # Lien physique : instantané, sans recopier le fichier. L'original n'est
+        # jamais modifié sur place (voir write_plist_atomic), la sauvegarde reste intacte.
+        os.link(bookmarks_path, backup_path)
+    except OSError:
+        shutil.copy2(bookmarks_path, backup_path)
     return backup_path
 
+def write_plist_atomic(data, path: Path):
+    """
+    Écrit le plist dans un fichier temporaire du même dossier, puis le renomme
+    par-dessus l'original (os.replace) : jamais de Bookmarks.plist à moitié écrit.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".Bookmarks.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            plistlib.dump(data, f)
+            # Données sur disque avant le renommage : après une coupure de courant,
+            # Bookmarks.plist est soit l'ancien, soit le nouveau, jamais vide
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
 # --- Main ---------------------------------------------------------------------
 def main():
     parser = argparse.ArgumentParser(
@@ -156,7 +189,8 @@ def main():
 
     # Filtrer
     children = data.get("Children", [])
-    new_children, deleted = filter_children(children, targets, ignore_folders, args.dry_run)
+    exact, suffixes = compile_domains(targets)
+    new_children, deleted = filter_children(children, exact, suffixes, ignore_folders, args.dry_run)
 
     if args.dry_run:
         print(f"\n✅ Dry-run terminé : {deleted} signet(s) seraient supprimé(s). Aucune modification écrite.")
@@ -166,15 +200,12 @@ def main():
     # Appliquer et sauvegarder
     data["Children"] = new_children
     try:
-        with open(path, "wb") as f:
-            plistlib.dump(data, f)
+        write_plist_atomic(data, path)
         print(f"\n✅ Terminé : {deleted} signet(s) supprimé(s).")
         print("   Relance Safari (et re-active iCloud si tu l’avais coupé).")
     except Exception as e:
-        print(f"❌ Erreur d'écriture du plist, restauration de la sauvegarde… ({e})")
-        backup_bytes = backup_path.read_bytes()
-        path.write_bytes(backup_bytes)
-        print("↩️  Fichier original restauré.")
+        print(f"❌ Erreur d'écriture du plist ({e})")
+        print("↩️  Fichier original intact (écriture atomique), rien à restaurer.")
         sys.exit(1)
 
 if __name__ == "__main__":